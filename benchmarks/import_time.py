@@ -0,0 +1,43 @@
+# -*- encoding: utf-8 -*-
+'''
+Measure the cost of `import rmdup` in a fresh interpreter.
+
+Compares against an empty interpreter start and against importing the modules
+the single file rmdup.py used to pull in (argparse, shutil, tempfile, unittest).
+'''
+import os
+import subprocess
+import sys
+import time
+
+
+PACKAGE_PARENT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPEAT = 30
+
+SCRIPTS = [
+    ('interpreter start', 'pass'),
+    ('import rmdup', 'import rmdup'),
+    ('old rmdup.py imports', 'import argparse, os, shutil, tempfile, unittest'),
+]
+
+
+def best_time(script):
+    times = []
+    for _ in range(REPEAT):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', script], cwd=PACKAGE_PARENT_DIRECTORY)
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    baseline = None
+    for name, script in SCRIPTS:
+        elapsed = best_time(script)
+        if baseline is None:
+            baseline = elapsed
+        print '{0:25} {1:7.2f} ms  ({2:+.2f} ms)'.format(name, elapsed * 1000, (elapsed - baseline) * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+# -*- encoding: utf-8 -*-
+'''
+Determine if a file/directory is duplicate of another (with some relax) and optionally remove the duplicate.
+
+Importing the package is cheap: command line handling (rmdup.cli),
+the daemon (rmdup.daemon), hashlib and shutil are imported only when used.
+'''
+from .core import (
+    NotDuplicate,
+    file_exists,
+    files_in,
+    print_duplicate,
+    remove_file_or_dir,
+    same_content,
+    same_file_or_dir,
+    same_size)
+from .checker import (
+    DuplicateChecker,
+    file_digest,
+    not_duplicate_dir_reason,
+    not_duplicate_file_reason,
+    process_duplicate)
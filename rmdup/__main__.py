@@ -0,0 +1,5 @@
+# -*- encoding: utf-8 -*-
+from .cli import main
+
+
+main()
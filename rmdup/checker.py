@@ -0,0 +1,252 @@
+# -*- encoding: utf-8 -*-
+import os
+import stat
+
+from . import core
+from .core import NotDuplicate, _is_skipped, _make_skip_path_tree, _read_block, files_in, remove_file_or_dir
+
+
+def _file_digest(f, read_block=_read_block):
+    import hashlib
+
+    digest = hashlib.sha1()
+    buff = True # just started
+    while buff:
+        buff = read_block(f)
+        digest.update(buff)
+    return digest.hexdigest()
+
+
+def file_digest(fname, read_block=_read_block):
+    with open(fname, 'rb') as f:
+        return _file_digest(f, read_block)
+
+
+def _open_regular_file(fname):
+    '''File object to read fname, None if it is not a regular file - opening a FIFO could block forever'''
+    fd = os.open(fname, os.O_RDONLY | os.O_NONBLOCK)
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        os.close(fd)
+        return None
+    return os.fdopen(fd, 'rb')
+
+
+def _signature(st):
+    '''Changes whenever the content might have changed - users can restore mtime, but not ctime'''
+    return (st.st_size, st.st_mtime, st.st_ctime, st.st_ino)
+
+
+class DuplicateChecker:
+    '''Duplicate checks sharing walk results and content digests between calls.
+
+    Walk results of the original are reused until forget(): files added to
+    the original later are reported as extra files of the duplicate,
+    call forget() to see them.
+    The duplicate is always walked again and every check stats all files again.
+    Digests of files found to be the same are kept while the file's signature
+    is unchanged, they are used only to reject different files quickly:
+    equal content is always confirmed by comparing the files.
+
+    verbose: report progress on stdout like rmdup always did
+    '''
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self._walks = {}
+        self._stats = {}
+        self._digests = {}
+
+    def forget(self, path=None):
+        '''Drop walk results and stat data involving path (everything by default)'''
+        if path is None:
+            self._walks.clear()
+            self._stats.clear()
+            return
+
+        path = os.path.abspath(path)
+        below_path = os.path.join(path, '')
+        for directory in self._walks.keys():
+            if (directory == path
+                    or directory.startswith(below_path)
+                    or path.startswith(os.path.join(directory, ''))):
+                del self._walks[directory]
+        for p in self._stats.keys():
+            if p == path or p.startswith(below_path):
+                del self._stats[p]
+
+    def stat(self, path):
+        '''os.stat() result or None if path does not exist'''
+        path = os.path.abspath(path)
+        if path not in self._stats:
+            try:
+                self._stats[path] = os.stat(path)
+            except OSError:
+                self._stats[path] = None
+        return self._stats[path]
+
+    def walk(self, directory, skip_paths=None):
+        '''Files below directory as they are now, skipped directories are not entered'''
+        return list(files_in(directory, skip_paths))
+
+    def files_in(self, directory, skip_paths=None):
+        '''Files below directory, the walk is reused until forget()'''
+        directory = os.path.abspath(directory)
+        if directory not in self._walks:
+            self._walks[directory] = self.walk(directory)
+        skip_path_tree = _make_skip_path_tree(skip_paths)
+        return [f for f in self._walks[directory] if not _is_skipped(f, skip_path_tree)]
+
+    def digest(self, fname):
+        st = self.stat(fname)
+        if st is None:
+            return None
+        fname = os.path.abspath(fname)
+        signature = _signature(st)
+        cached = self._digests.get(fname)
+        if cached is None or cached[0] != signature:
+            cached = self._digests[fname] = (signature, file_digest(fname))
+        return cached[1]
+
+    def known_digest(self, fname):
+        '''Digest of fname if it is already computed and still valid, None otherwise'''
+        st = self.stat(fname)
+        cached = self._digests.get(os.path.abspath(fname))
+        if st is None or cached is None or cached[0] != _signature(st):
+            return None
+        return cached[1]
+
+    def same_file_or_dir(self, path1, path2):
+        # never cached: removing an alias of the original would lose it
+        return core.same_file_or_dir(path1, path2)
+
+    def size(self, fname):
+        st = self.stat(fname)
+        if st is None:
+            return None
+        return st.st_size
+
+    def same_size(self, fname1, fname2):
+        size1 = self.size(fname1)
+        return size1 is not None and size1 == self.size(fname2)
+
+    def same_content(self, fname1, fname2):
+        if not self.same_size(fname1, fname2):
+            return False
+        digest1 = self.known_digest(fname1)
+        digest2 = self.known_digest(fname2)
+        if digest1 is not None and digest2 is not None and digest1 != digest2:
+            return False
+        return self._compare(fname1, fname2)
+
+    def _compare(self, fname1, fname2):
+        '''Compare the content of two files, keep their digest if they are the same'''
+        import hashlib
+
+        f1 = _open_regular_file(fname1)
+        if f1 is None:
+            return False
+        with f1:
+            f2 = _open_regular_file(fname2)
+            if f2 is None:
+                return False
+            with f2:
+                digest = hashlib.sha1()
+                buff1 = True # just started
+                while buff1:
+                    buff1 = _read_block(f1)
+                    buff2 = _read_block(f2)
+                    if buff1 != buff2:
+                        return False
+                    digest.update(buff1)
+                signature1 = _signature(os.fstat(f1.fileno()))
+                signature2 = _signature(os.fstat(f2.fileno()))
+
+        digest = digest.hexdigest()
+        self._digests[os.path.abspath(fname1)] = (signature1, digest)
+        self._digests[os.path.abspath(fname2)] = (signature2, digest)
+        return True
+
+    def not_duplicate_file_reason(self, fname1, fname2):
+        if self.same_file_or_dir(fname1, fname2):
+            return '"{0}" and "{1}" are referencing the same file'.format(fname1, fname2)
+
+        if not self.same_content(fname1, fname2):
+            return 'files "{0}" and "{1}" differ'.format(fname1, fname2)
+
+        return None
+
+    def not_duplicate_dir_reason(self, directory, duplicate_candidate, ignored_differences):
+        '''
+        Check if the duplicate candidate can be safely removed (all files exist elsewhere or we explicitly ignore the different files).
+
+        Returns
+          None if the candidate can be safely removed
+          or a string explanation about the data loss if the candidate is removed.
+        '''
+
+        if self.same_file_or_dir(directory, duplicate_candidate):
+            return '"{0}" and "{1}" are referencing the same directory'.format(directory, duplicate_candidate)
+
+        # what is removed is never cached, ignored directories might not even be readable
+        possible_duplicate_files = set(self.walk(duplicate_candidate, ignored_differences))
+
+        extra_files = possible_duplicate_files - set(self.files_in(directory))
+        if extra_files:
+            return 'duplicate candidate contains extra non-duplicate file[s]: {0}'.format(sorted(extra_files))
+
+        for f in possible_duplicate_files:
+            fname = os.path.join(directory, f)
+            candidate_fname = os.path.join(duplicate_candidate, f)
+            if not self.same_size(fname, candidate_fname):
+                return 'sizes of files "{0}" and "{1}" differ'.format(fname, candidate_fname)
+
+        if self.verbose:
+            print 'sizes match, comparing content'
+
+        for f in possible_duplicate_files:
+            fname = os.path.join(directory, f)
+            candidate_fname = os.path.join(duplicate_candidate, f)
+            if not self.same_content(fname, candidate_fname):
+                return 'files "{0}" and "{1}" differ'.format(fname, candidate_fname)
+
+        return None
+
+    def not_duplicate_reason(self, orig, duplicate, ignored_differences=None):
+        '''
+        Returns
+          None if duplicate can be safely removed
+          or a string explanation why it can not be.
+        '''
+        # what is removed must be checked in its current state
+        self.forget(duplicate)
+        # sizes and digest signatures of the original must be current too
+        self._stats.clear()
+
+        duplicate_stat = self.stat(duplicate)
+        if duplicate_stat is None:
+            return '"{0}" does not exist'.format(duplicate)
+
+        if stat.S_ISDIR(duplicate_stat.st_mode):
+            return self.not_duplicate_dir_reason(orig, duplicate, ignored_differences)
+        return self.not_duplicate_file_reason(orig, duplicate)
+
+    def process_duplicate(self, orig, duplicate, ignored_differences=None, process=remove_file_or_dir):
+        reason_not_duplicate = self.not_duplicate_reason(orig, duplicate, ignored_differences)
+
+        if reason_not_duplicate is None:
+            process(duplicate)
+            self.forget(duplicate)
+        else:
+            raise NotDuplicate(orig, duplicate, reason_not_duplicate)
+
+
+def not_duplicate_file_reason(fname1, fname2):
+    return DuplicateChecker(verbose=True).not_duplicate_file_reason(fname1, fname2)
+
+
+def not_duplicate_dir_reason(directory, duplicate_candidate, ignored_differences):
+    return DuplicateChecker(verbose=True).not_duplicate_dir_reason(directory, duplicate_candidate, ignored_differences)
+
+
+def process_duplicate(orig, duplicate, ignored_differences=None, process=remove_file_or_dir):
+    DuplicateChecker(verbose=True).process_duplicate(orig, duplicate, ignored_differences, process)
@@ -0,0 +1,25 @@
+# -*- encoding: utf-8 -*-
+import argparse
+
+from .checker import DuplicateChecker
+from .core import NotDuplicate, print_duplicate, remove_file_or_dir
+
+
+def mkparser():
+    parser = argparse.ArgumentParser(
+        prog='rmdup',
+        description='Determine if a file/directory is duplicate of another (with some relax) and optionally remove the duplicate')
+    parser.add_argument('main', help='primary location - will be kept')
+    parser.add_argument('duplicate', help='location of duplicate - may be removed if contains no unknown change')
+    parser.add_argument('ignored_differences', nargs='*', help='extra or changed files in duplicate, that are known and can be removed')
+    parser.add_argument('-n', '--dry-run', dest='duplicate_processor', default=remove_file_or_dir, const=print_duplicate, action='store_const',
+        help='just say if something would be removed instead of actually removing it')
+    return parser
+
+
+def main(argv=None):
+    args = mkparser().parse_args(argv)
+    try:
+        DuplicateChecker(verbose=True).process_duplicate(args.main, args.duplicate, args.ignored_differences, args.duplicate_processor)
+    except NotDuplicate as e:
+        print e
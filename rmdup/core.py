@@ -0,0 +1,130 @@
+# -*- encoding: utf-8 -*-
+import os
+
+
+READ_BUFFER_SIZE = 100 * 1024 ** 2
+
+
+class NotDuplicate(Exception):
+
+    def __init__(self, orig, duplicate, reason):
+        self.orig = orig
+        self.duplicate = duplicate
+        self.reason = reason
+
+    def __str__(self):
+        return '"{self.orig}" and "{self.duplicate}" are not duplicates: {self.reason}'.format(self=self)
+
+
+def file_exists(fname):
+    return os.path.exists(fname)
+
+
+def same_file_or_dir(path1, path2):
+    try:
+        return os.stat(path1) == os.stat(path2)
+    except OSError:
+        return False
+
+
+def _read_block(file):
+    return file.read(READ_BUFFER_SIZE)
+
+
+# FIXME: test?
+def same_size(fname1, fname2):
+    try:
+        if os.path.getsize(fname1) != os.path.getsize(fname2):
+            return False
+    except OSError:
+        return False
+
+    return True
+
+
+def same_content(fname1, fname2, read_block=_read_block):
+    # sizes must match
+    if not same_size(fname1, fname2):
+        return False
+
+    # compare contents
+    with open(fname1, 'rb') as f1:
+        with open(fname2, 'rb') as f2:
+            buff1 = True # just started
+            while buff1:
+                buff1 = read_block(f1)
+                buff2 = read_block(f2)
+                if buff1 != buff2:
+                    return False
+
+    return True
+
+
+def _split(relpath):
+    return relpath.split(os.sep) if relpath else []
+
+
+def _make_skip_path_tree(path_list):
+    path_list = path_list or []
+    skip_path_tree = {}
+
+    for skip_path in path_list:
+        tree = skip_path_tree
+        for path in skip_path.split(os.path.sep):
+            tree[path] = tree.get(path, {})
+            tree = tree[path]
+        tree.clear()
+
+    return skip_path_tree
+
+
+def _is_skipped(relpath, skip_path_tree):
+    '''Would files_in skip relpath with the given skip path tree?'''
+    tree = skip_path_tree
+    for name in _split(relpath):
+        if name in tree and 0 == len(tree[name]):
+            return True
+        tree = tree.get(name, {})
+    return False
+
+
+def _files_in(directory, skip_path_tree):
+    '''directory -> [fname]
+
+    Subdirectories are traversed.
+    Files in skip_paths are not listed,
+    directories in skip_paths are not traversed.
+    '''
+
+    files_and_dirs = os.listdir(directory)
+    for path in files_and_dirs:
+        if path in skip_path_tree and 0 == len(skip_path_tree[path]):
+            # leaf in skip path tree
+            continue
+
+        full_path = os.path.join(directory, path)
+        if os.path.isdir(full_path):
+            for f in _files_in(full_path, skip_path_tree.get(path, {})):
+                yield f
+        else:
+            yield full_path
+
+
+def files_in(directory, skip_paths=None):
+    return (os.path.relpath(f, directory) for f in _files_in(directory, _make_skip_path_tree(skip_paths)))
+
+
+def remove_file_or_dir(path):
+    import shutil
+
+    isdir = os.path.isdir(path)
+
+    print 'removing {0}'.format(path)
+    if isdir:
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def print_duplicate(path):
+    print 'in non dry-run mode, "{0}" would be removed'.format(path)
@@ -0,0 +1,653 @@
+# -*- encoding: utf-8 -*-
+'''
+Long running duplicate checker for continuously growing archives.
+
+`python -m rmdup.daemon serve ROOT` keeps stat data and content digests of all files below ROOT
+in memory, keeps them current with inotify and answers duplicate checks on a Unix socket.
+The index is saved on exit and reloaded on start, so only the stat walk is repeated
+- digests of unchanged files are kept.
+
+Files below ROOT are compared by their digests alone, so checking real duplicates
+does not read them and takes milliseconds. This trusts that a digest in the index
+belongs to the current content: it is dropped on every inotify modify event and
+whenever (size, mtime, ctime, inode) of the file changes. Changes inotify does not
+report (writes through shared memory maps, other hosts on network file systems)
+are noticed only on restart, and an SHA-1 collision would be taken for equality.
+Files not hashed in the background yet are hashed while answering, blocking the daemon.
+
+`python -m rmdup.daemon check MAIN DUPLICATE [IGNORED...]` is the equivalent of `python -m rmdup` using the daemon.
+'''
+import cPickle as pickle
+import ctypes
+import ctypes.util
+import collections
+import errno
+import hashlib
+import os
+import select
+import signal
+import socket
+import stat
+import struct
+import sys
+
+from .checker import DuplicateChecker, _file_digest, _open_regular_file, _signature
+from .core import (
+    NotDuplicate,
+    _is_skipped,
+    _make_skip_path_tree,
+    _split,
+    files_in,
+    print_duplicate,
+    remove_file_or_dir)
+
+
+DEFAULT_SOCKET = os.path.expanduser('~/.rmdupd.sock')
+DEFAULT_INDEX_FILE = os.path.expanduser('~/.rmdupd.index')
+# seconds a client may take to send its request
+REQUEST_TIMEOUT = 5
+# the only response allowing removal - anything else, even no response, means not duplicate
+DUPLICATE_RESPONSE = 'OK\0'
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct('iIII')
+_EVENT_BUFFER_SIZE = 64 * 1024
+
+# digests are computed in the background in blocks of this size, between requests
+HASH_BLOCK_SIZE = 1024 ** 2
+
+# version of the saved index layout
+INDEX_FORMAT = 2
+
+
+def _join(relpath, name):
+    return os.path.join(relpath, name) if relpath else name
+
+
+def _overlap(relpath1, relpath2):
+    '''Is one of the paths below the other?'''
+    if not relpath1 or not relpath2 or relpath1 == relpath2:
+        return True
+    return (relpath1.startswith(os.path.join(relpath2, ''))
+            or relpath2.startswith(os.path.join(relpath1, '')))
+
+
+def _find(tree, relpath):
+    '''Node at relpath in a tree of nested dicts or None'''
+    node = tree
+    for name in _split(relpath):
+        if not isinstance(node, dict) or name not in node:
+            return None
+        node = node[name]
+    return node
+
+
+class DuplicateIndex(DuplicateChecker):
+    '''DuplicateChecker using stat data and content digests of files below root kept in memory.
+
+    The index must be kept current by the caller (see IndexWatcher),
+    paths outside of root and in untrusted subtrees - which could not be
+    read or watched - are handled by DuplicateChecker.
+
+    Directories are nested dicts, files are [signature, digest] lists,
+    where signature is (size, mtime, ctime, inode) and
+    digest is None until computed by hash_step().
+    '''
+
+    def __init__(self, root):
+        DuplicateChecker.__init__(self)
+        self.root = os.path.abspath(root)
+        self.tree = {}
+        # relpaths of subtrees the index might not know everything about
+        self.untrusted = set()
+        # files which might need a digest
+        self._unhashed = collections.deque()
+        # (entry, file, digest) of the file being hashed
+        self._hashing = None
+
+    def relpath(self, path):
+        '''path relative to root or None if path is not below root'''
+        path = os.path.abspath(path)
+        if path == self.root:
+            return ''
+        prefix = os.path.join(self.root, '')
+        if not path.startswith(prefix):
+            return None
+        return path[len(prefix):]
+
+    def fullpath(self, relpath):
+        return os.path.join(self.root, relpath)
+
+    def distrust(self, relpath, error):
+        sys.stderr.write('not indexing "{0}": {1}\n'.format(self.fullpath(relpath), error))
+        self.untrusted.add(relpath)
+
+    def indexed_relpath(self, path):
+        '''path relative to root or None if the index can not answer questions about path'''
+        relpath = self.relpath(path)
+        if relpath is None:
+            return None
+        for untrusted in self.untrusted:
+            if _overlap(relpath, untrusted):
+                return None
+        return relpath
+
+    def entry(self, relpath):
+        entry = _find(self.tree, relpath)
+        if isinstance(entry, list):
+            return entry
+        return None
+
+    def files(self, relpath):
+        '''Files below directory relpath, relative to it'''
+        node = _find(self.tree, relpath)
+        if not isinstance(node, dict):
+            return
+        stack = [('', node)]
+        while stack:
+            prefix, node = stack.pop()
+            for name, child in node.iteritems():
+                path = _join(prefix, name)
+                if isinstance(child, dict):
+                    stack.append((path, child))
+                else:
+                    yield path
+
+    def discard(self, relpath):
+        '''Forget about relpath (file or directory), return its old node'''
+        if not relpath:
+            old, self.tree = self.tree, {}
+            return old
+
+        parts = _split(relpath)
+        parent = _find(self.tree, os.sep.join(parts[:-1]))
+        if not isinstance(parent, dict):
+            return None
+        return parent.pop(parts[-1], None)
+
+    def update(self, relpath, previous=None):
+        '''Refresh stat data of file relpath.
+
+        The digest is kept if the signature did not change.
+        '''
+        if previous is None:
+            previous = self.entry(relpath)
+
+        try:
+            st = os.stat(self.fullpath(relpath))
+        except OSError:
+            self.discard(relpath)
+            return
+        if stat.S_ISDIR(st.st_mode):
+            return
+
+        node = self.tree
+        parts = _split(relpath)
+        for name in parts[:-1]:
+            child = node.get(name)
+            if not isinstance(child, dict):
+                child = node[name] = {}
+            node = child
+
+        signature = _signature(st)
+        if isinstance(previous, list) and previous[0] == signature:
+            node[parts[-1]] = previous
+        else:
+            node[parts[-1]] = [signature, None]
+        if node[parts[-1]][1] is None and stat.S_ISREG(st.st_mode):
+            self._unhashed.append(relpath)
+
+    def scan(self, relpath=''):
+        '''Re-read stat data of everything below directory relpath'''
+        old = self.discard(relpath)
+        try:
+            files = list(files_in(self.fullpath(relpath)))
+        except OSError as e:
+            if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                self.distrust(relpath, e)
+            return
+        for f in files:
+            previous = _find(old, f) if isinstance(old, dict) else None
+            self.update(_join(relpath, f), previous)
+
+    def hashing_pending(self):
+        return self._hashing is not None or bool(self._unhashed)
+
+    def hash_step(self):
+        '''Compute digests in the background, a block at a time.
+
+        An entry replaced meanwhile gets the digest of its old content,
+        so digests of changed files are never stored.
+        '''
+        if self._hashing is None:
+            while self._unhashed:
+                relpath = self._unhashed.popleft()
+                entry = self.entry(relpath)
+                if entry is None or entry[1] is not None:
+                    continue
+                try:
+                    f = _open_regular_file(self.fullpath(relpath))
+                except EnvironmentError:
+                    continue
+                if f is None:
+                    continue
+                self._hashing = (entry, f, hashlib.sha1())
+                break
+            else:
+                return
+
+        entry, f, digest = self._hashing
+        try:
+            buff = f.read(HASH_BLOCK_SIZE)
+        except IOError:
+            f.close()
+            self._hashing = None
+            return
+        if buff:
+            digest.update(buff)
+        else:
+            f.close()
+            self._hashing = None
+            entry[1] = digest.hexdigest()
+
+    def same_content(self, fname1, fname2):
+        if self.indexed_relpath(fname1) is None or self.indexed_relpath(fname2) is None:
+            return DuplicateChecker.same_content(self, fname1, fname2)
+        if not self.same_size(fname1, fname2):
+            return False
+        # trusted, see the module documentation
+        digest1 = self.digest(fname1)
+        return digest1 is not None and digest1 == self.digest(fname2)
+
+    def not_duplicate_reason(self, orig, duplicate, ignored_differences=None):
+        # nothing is cached between requests outside of the index: it is not watched
+        DuplicateChecker.forget(self)
+        self._digests.clear()
+        return DuplicateChecker.not_duplicate_reason(self, orig, duplicate, ignored_differences)
+
+    def forget(self, path=None):
+        # below root the index is kept current by its owner
+        if path is None or self.indexed_relpath(path) is None:
+            DuplicateChecker.forget(self, path)
+
+    def stat(self, path):
+        if self.indexed_relpath(path) is None:
+            return DuplicateChecker.stat(self, path)
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
+
+    def size(self, fname):
+        relpath = self.indexed_relpath(fname)
+        if relpath is None:
+            return DuplicateChecker.size(self, fname)
+        entry = self.entry(relpath)
+        if entry is None:
+            return None
+        return entry[0][0]
+
+    def walk(self, directory, skip_paths=None):
+        relpath = self.indexed_relpath(directory)
+        if relpath is None:
+            return DuplicateChecker.walk(self, directory, skip_paths)
+        skip_path_tree = _make_skip_path_tree(skip_paths)
+        return [f for f in self.files(relpath) if not _is_skipped(f, skip_path_tree)]
+
+    def files_in(self, directory, skip_paths=None):
+        if self.indexed_relpath(directory) is None:
+            return DuplicateChecker.files_in(self, directory, skip_paths)
+        return self.walk(directory, skip_paths)
+
+    def known_digest(self, fname):
+        relpath = self.indexed_relpath(fname)
+        if relpath is None:
+            return DuplicateChecker.known_digest(self, fname)
+        entry = self.entry(relpath)
+        if entry is None:
+            return None
+        return entry[1]
+
+    def digest(self, fname):
+        relpath = self.indexed_relpath(fname)
+        if relpath is None:
+            return DuplicateChecker.digest(self, fname)
+        entry = self.entry(relpath)
+        if entry is None:
+            return None
+        if entry[1] is None:
+            try:
+                f = _open_regular_file(fname)
+            except EnvironmentError:
+                return None
+            if f is None:
+                return None
+            with f:
+                entry[1] = _file_digest(f)
+        return entry[1]
+
+    def save(self, fname):
+        tmp_fname = fname + '.tmp'
+        with open(tmp_fname, 'wb') as f:
+            pickle.dump({'format': INDEX_FORMAT, 'root': self.root, 'tree': self.tree}, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_fname, fname)
+
+    @classmethod
+    def load(cls, fname, root):
+        '''Index of root, with the content of fname if it was saved for the same root.
+
+        The loaded data might be stale, scan() before use.
+        Indices saved in an other format, for an other root
+        or that can not be read at all are ignored.
+        '''
+        index = cls(root)
+        try:
+            with open(fname, 'rb') as f:
+                data = pickle.load(f)
+        except Exception:
+            # missing, truncated or foreign file: unpickling can raise almost anything
+            return index
+        if (isinstance(data, dict)
+                and data.get('format') == INDEX_FORMAT
+                and data.get('root') == index.root
+                and isinstance(data.get('tree'), dict)):
+            index.tree = data['tree']
+        return index
+
+
+class Inotify:
+    '''Minimal non-blocking inotify binding'''
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            self._raise_errno()
+
+    def _raise_errno(self, path=None):
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), path)
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, path, mask)
+        if wd < 0:
+            self._raise_errno(path)
+        return wd
+
+    def rm_watch(self, wd):
+        # the watch might be already gone with its directory
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self):
+        '''Pending events as [(wd, mask, name)]'''
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, _EVENT_BUFFER_SIZE)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    return events
+                raise
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip('\0')
+                offset += length
+                events.append((wd, mask, name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class IndexWatcher:
+    '''Keeps a DuplicateIndex current by watching all directories below its root.
+
+    Symbolic links to directories are followed - as files_in does -,
+    so a directory might be watched under more than one path.
+    '''
+
+    def __init__(self, index, inotify=None):
+        self.index = index
+        self.inotify = inotify or Inotify()
+        self.watches = {}
+
+    def watch_tree(self, relpath=''):
+        def distrust(error):
+            if error.errno not in (errno.ENOENT, errno.ENOTDIR):
+                self.index.distrust(self.index.relpath(error.filename), error)
+
+        for dirpath, _dirs, _files in os.walk(self.index.fullpath(relpath), onerror=distrust, followlinks=True):
+            try:
+                wd = self.inotify.add_watch(dirpath)
+            except OSError as e:
+                # ENOENT: removed meanwhile, anything else (e.g. ENOSPC - out of watches):
+                # changes below dirpath would not be noticed
+                distrust(e)
+                continue
+            self.watches.setdefault(wd, set()).add(self.index.relpath(dirpath))
+
+    def unwatch_tree(self, relpath):
+        below_relpath = os.path.join(relpath, '')
+        for wd, paths in self.watches.items():
+            paths.difference_update([p for p in paths if p == relpath or p.startswith(below_relpath)])
+            if not paths:
+                self.inotify.rm_watch(wd)
+                del self.watches[wd]
+
+    def rescan(self):
+        '''Rebuild watches and index from scratch - events might be lost'''
+        self.watches.clear()
+        self.index.untrusted.clear()
+        self.watch_tree()
+        self.index.scan()
+
+    def process_event(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            self.rescan()
+            return
+        if mask & IN_IGNORED:
+            self.watches.pop(wd, None)
+            return
+        if not name:
+            return
+
+        for directory in list(self.watches.get(wd, ())):
+            self._process_change(_join(directory, name), mask)
+
+    def _process_change(self, relpath, mask):
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            self.unwatch_tree(relpath)
+            self.index.discard(relpath)
+        elif mask & (IN_CREATE | IN_MOVED_TO) and (
+                mask & IN_ISDIR or os.path.isdir(self.index.fullpath(relpath))):
+            # watch first, so files created in the new directory meanwhile are not missed
+            self.watch_tree(relpath)
+            self.index.scan(relpath)
+        elif not mask & IN_ISDIR:
+            if mask & (IN_MODIFY | IN_CLOSE_WRITE):
+                # content changed, even if size and times were restored
+                self.index.discard(relpath)
+            self.index.update(relpath)
+
+    def process_events(self):
+        for wd, mask, name in self.inotify.read_events():
+            self.process_event(wd, mask, name)
+
+
+def _recv_all(conn):
+    chunks = []
+    while True:
+        chunk = conn.recv(64 * 1024)
+        if not chunk:
+            return ''.join(chunks)
+        chunks.append(chunk)
+
+
+class DuplicateServer:
+    '''Answers duplicate checks on a Unix socket.
+
+    Request: orig, duplicate and the ignored differences separated by NUL bytes.
+    Response: DUPLICATE_RESPONSE for duplicates, the reason otherwise.
+    Clients not sending their whole request in time are dropped.
+    '''
+
+    def __init__(self, watcher, socket_path, timeout=REQUEST_TIMEOUT):
+        self.watcher = watcher
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.socket = None
+
+    def handle(self, conn):
+        conn.settimeout(self.timeout)
+        try:
+            self._handle(conn)
+        except socket.error:
+            # the client is gone or too slow, nobody to answer
+            pass
+
+    def _handle(self, conn):
+        request = _recv_all(conn).split('\0')
+        if len(request) < 2:
+            reason = 'malformed request'
+        else:
+            # answer on the state after all changes so far
+            self.watcher.process_events()
+            orig, duplicate, ignored_differences = request[0], request[1], request[2:]
+            try:
+                reason = self.watcher.index.not_duplicate_reason(orig, duplicate, ignored_differences)
+            except EnvironmentError as e:
+                reason = 'checking failed: {0}'.format(e)
+        conn.sendall(reason or DUPLICATE_RESPONSE)
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(self.socket_path)
+        self.socket.listen(5)
+        try:
+            inotify_fd = self.watcher.inotify.fd
+            index = self.watcher.index
+            while True:
+                # do not wait when there are digests to compute
+                timeout = 0 if index.hashing_pending() else None
+                try:
+                    readable, _, _ = select.select([inotify_fd, self.socket], [], [], timeout)
+                except select.error as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+                if inotify_fd in readable:
+                    self.watcher.process_events()
+                if self.socket in readable:
+                    conn, _ = self.socket.accept()
+                    try:
+                        self.handle(conn)
+                    finally:
+                        conn.close()
+                if not readable:
+                    index.hash_step()
+        finally:
+            self.socket.close()
+            os.remove(self.socket_path)
+
+
+def query(socket_path, orig, duplicate, ignored_differences=None):
+    '''Ask the daemon, returns None for duplicates, the reason otherwise'''
+    request = [os.path.abspath(orig), os.path.abspath(duplicate)] + list(ignored_differences or [])
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+        conn.sendall('\0'.join(request))
+        conn.shutdown(socket.SHUT_WR)
+        response = _recv_all(conn)
+    finally:
+        conn.close()
+
+    if response == DUPLICATE_RESPONSE:
+        return None
+    return response or 'no answer from the daemon'
+
+
+def process_duplicate(socket_path, orig, duplicate, ignored_differences=None, process=remove_file_or_dir):
+    reason_not_duplicate = query(socket_path, orig, duplicate, ignored_differences)
+
+    if reason_not_duplicate is None:
+        process(duplicate)
+    else:
+        raise NotDuplicate(orig, duplicate, reason_not_duplicate)
+
+
+def serve(root, socket_path, index_file):
+    index = DuplicateIndex.load(index_file, root)
+    watcher = IndexWatcher(index)
+    # changes while we were not running are unknown
+    watcher.rescan()
+    index.save(index_file)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        DuplicateServer(watcher, socket_path).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        index.save(index_file)
+
+
+def mkparser():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='rmdup.daemon',
+        description='Keep an index of files and their content digests up to date and answer duplicate checks using it')
+    parser.add_argument('-s', '--socket', default=DEFAULT_SOCKET, help='Unix socket of the daemon (default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command')
+
+    serve_parser = subparsers.add_parser('serve', help='run the daemon')
+    serve_parser.add_argument('root', help='directory to index')
+    serve_parser.add_argument('-i', '--index-file', default=DEFAULT_INDEX_FILE,
+        help='the index is persisted here between runs (default: %(default)s)')
+
+    check_parser = subparsers.add_parser('check', help='same as python -m rmdup, but using the daemon')
+    check_parser.add_argument('main', help='primary location - will be kept')
+    check_parser.add_argument('duplicate', help='location of duplicate - may be removed if contains no unknown change')
+    check_parser.add_argument('ignored_differences', nargs='*', help='extra or changed files in duplicate, that are known and can be removed')
+    check_parser.add_argument('-n', '--dry-run', dest='duplicate_processor', default=remove_file_or_dir, const=print_duplicate, action='store_const',
+        help='just say if something would be removed instead of actually removing it')
+    return parser
+
+
+def main(argv=None):
+    args = mkparser().parse_args(argv)
+    if args.command == 'serve':
+        serve(args.root, args.socket, args.index_file)
+    else:
+        try:
+            process_duplicate(args.socket, args.main, args.duplicate, args.ignored_differences, args.duplicate_processor)
+        except NotDuplicate as e:
+            print e
+        except socket.error as e:
+            print 'can not reach the daemon at "{0}": {1}'.format(args.socket, e)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,404 @@
+# -*- encoding: utf-8 -*-
+import os
+import subprocess
+import sys
+import unittest
+
+from rmdup.checker import (
+    DuplicateChecker,
+    file_digest,
+    not_duplicate_dir_reason,
+    not_duplicate_file_reason,
+    process_duplicate)
+from rmdup.core import NotDuplicate, file_exists
+from util import EXISTING_FILE, TempDir
+
+
+PACKAGE_PARENT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Test_not_duplicate_file_reason(unittest.TestCase):
+
+    def test_two_files_same_content_is_duplicate(self):
+        with TempDir() as d:
+            d.make_file('1', '')
+            d.make_file('2', '')
+            reason = not_duplicate_file_reason(d.subpath('1'), d.subpath('2'))
+            self.assertIsNone(reason)
+
+    def test_different_content_not_duplicate(self):
+        with TempDir() as d:
+            d.make_file('1', '')
+            d.make_file('2', '2')
+            reason = not_duplicate_file_reason(d.subpath('1'), d.subpath('2'))
+            self.assertIn('differ', reason)
+
+    def test_same_file_is_not_duplicate(self):
+        reason = not_duplicate_file_reason(EXISTING_FILE, EXISTING_FILE)
+        self.assertIn('referencing the same file', reason)
+
+
+class Test_not_duplicate_dir_reason(unittest.TestCase):
+
+    def test_two_empty_dirs_are_duplicates(self):
+        with TempDir() as d:
+            directory = d.subpath('directory')
+            os.mkdir(directory)
+
+            candidate_dir = d.subpath('candidate_dir')
+            os.mkdir(candidate_dir)
+
+            reason = not_duplicate_dir_reason(directory, candidate_dir, [])
+            self.assertIsNone(reason)
+
+    def test_same_directory_is_not_duplicate(self):
+        d = os.getcwd()
+        reason = not_duplicate_dir_reason(d, d, [])
+        self.assertIn('referencing the same directory', reason)
+
+    def test_candidate_has_extra_file_not_duplicate(self):
+        with TempDir() as d:
+            directory = d.subpath('directory')
+            os.mkdir(directory)
+
+            candidate_dir = d.subpath('candidate_dir')
+            os.mkdir(candidate_dir)
+            d.make_file('candidate_dir/extra_file', '')
+
+            reason = not_duplicate_dir_reason(directory, candidate_dir, [])
+            self.assertIn('duplicate candidate contains extra non-duplicate file[s]:', reason)
+
+    def test_candidate_has_a_file_with_different_content_not_duplicate(self):
+        with TempDir() as d:
+            directory = d.subpath('directory')
+            d.make_file('directory/d/file', '')
+
+            candidate_dir = d.subpath('candidate_dir')
+            d.make_file('candidate_dir/d/file', 'x')
+
+            reason = not_duplicate_dir_reason(directory, candidate_dir, [])
+            self.assertIn('differ', reason)
+
+    def test_change_in_ignored_file_duplicate(self):
+        with TempDir() as d:
+            directory = d.subpath('directory')
+            d.make_file('directory/d/file', '')
+
+            candidate_dir = d.subpath('candidate_dir')
+            d.make_file('candidate_dir/d/file', 'x')
+
+            reason = not_duplicate_dir_reason(directory, candidate_dir, ['d'])
+            self.assertIsNone(reason)
+
+    def test_extra_files_under_ignored_directory_duplicate(self):
+        with TempDir() as d:
+            directory = d.subpath('directory')
+            d.make_file('directory/file', '')
+
+            candidate_dir = d.subpath('candidate_dir')
+            d.make_file('candidate_dir/file', '')
+            d.make_file('candidate_dir/d/extra_file', '')
+            d.make_file('candidate_dir/d/extra_file2', '')
+
+            reason = not_duplicate_dir_reason(directory, candidate_dir, ['d'])
+            self.assertIsNone(reason)
+
+
+class Test_process_duplicate(unittest.TestCase):
+
+    def test_duplicate_file_is_removed(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asd')
+
+            orig = d.subpath('1')
+            duplicate = d.subpath('2')
+            process_duplicate(orig, duplicate)
+
+            self.assertTrue(file_exists(orig))
+            self.assertFalse(file_exists(duplicate))
+
+    def test_non_duplicate_file_is_not_removed(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asdf')
+
+            orig = d.subpath('1')
+            duplicate = d.subpath('2')
+            try:
+                process_duplicate(orig, duplicate)
+                self.fail('NotDuplicate not raised')
+            except NotDuplicate:
+                pass
+
+            self.assertTrue(file_exists(orig))
+            self.assertTrue(file_exists(duplicate))
+
+    def test_duplicate_dir_is_removed(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            d.make_file('2/extra', 'whatever')
+
+            orig = d.subpath('1')
+            duplicate = d.subpath('2')
+            process_duplicate(orig, duplicate, ['extra'])
+
+            self.assertTrue(file_exists(orig))
+            self.assertFalse(file_exists(duplicate))
+
+    def test_non_duplicate_dir_is_not_removed(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            d.make_file('2/extra', 'whatever')
+
+            orig = d.subpath('1')
+            duplicate = d.subpath('2')
+            try:
+                process_duplicate(orig, duplicate)
+                self.fail('NotDuplicate not raised')
+            except NotDuplicate:
+                pass
+
+            self.assertTrue(file_exists(orig))
+            self.assertTrue(file_exists(duplicate))
+
+    def test_duplicate_does_not_exist_raises_error(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+
+            orig = d.subpath('1')
+            duplicate = d.subpath('2')
+            self.assertRaises(NotDuplicate,
+                lambda: process_duplicate(orig, duplicate))
+
+            self.assertTrue(file_exists(orig))
+            self.assertFalse(file_exists(duplicate))
+
+    def test_removal_is_done_with_the_process_parameter(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asd')
+
+            orig = d.subpath('1')
+            duplicate = d.subpath('2')
+            process_called = set()
+            def check_process_called(arg):
+                process_called.add(arg)
+
+            process_duplicate(orig, duplicate, process=check_process_called)
+
+            self.assertEqual(process_called, set([duplicate]))
+            self.assertTrue(file_exists(orig))
+            # it was not removed in our version of process!
+            self.assertTrue(file_exists(duplicate))
+
+
+class Test_DuplicateChecker(unittest.TestCase):
+
+    def test_duplicate_files(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asd')
+            d.make_file('3', 'asf')
+            checker = DuplicateChecker()
+
+            self.assertIsNone(checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+            self.assertIn('differ', checker.not_duplicate_reason(d.subpath('1'), d.subpath('3')))
+
+    def test_same_file_is_not_duplicate(self):
+        reason = DuplicateChecker().not_duplicate_reason(EXISTING_FILE, EXISTING_FILE)
+        self.assertIn('referencing the same file', reason)
+
+    def test_duplicate_dirs_with_ignored_differences(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            d.make_file('2/extra/file', 'whatever')
+            checker = DuplicateChecker()
+
+            reason = checker.not_duplicate_reason(d.subpath('1'), d.subpath('2'))
+            self.assertIn('extra non-duplicate file[s]', reason)
+            self.assertIsNone(checker.not_duplicate_reason(d.subpath('1'), d.subpath('2'), ['extra']))
+
+    def test_dirs_with_different_sizes_not_duplicate(self):
+        with TempDir() as d:
+            d.make_file('1/d/f', 'asd')
+            d.make_file('2/d/f', 'asdf')
+
+            reason = DuplicateChecker().not_duplicate_reason(d.subpath('1'), d.subpath('2'))
+            self.assertIn('sizes of files', reason)
+
+    def test_duplicate_is_walked_again_on_every_check(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            checker = DuplicateChecker()
+            self.assertIsNone(checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+            d.make_file('2/extra', '')
+
+            reason = checker.not_duplicate_reason(d.subpath('1'), d.subpath('2'))
+            self.assertIn('extra non-duplicate file[s]', reason)
+
+    def test_ignored_directory_of_duplicate_is_not_entered(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            d.make_file('2/unreadable/file', 'whatever')
+            unreadable = d.subpath('2/unreadable')
+            listdir = os.listdir
+
+            def listdir_failing_in_unreadable(path):
+                if os.path.abspath(path) == unreadable:
+                    raise OSError(13, 'Permission denied', path)
+                return listdir(path)
+
+            os.listdir = listdir_failing_in_unreadable
+            try:
+                checker = DuplicateChecker()
+                self.assertIsNone(checker.not_duplicate_reason(d.subpath('1'), d.subpath('2'), ['unreadable']))
+            finally:
+                os.listdir = listdir
+
+    def test_walk_of_duplicate_is_not_kept(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            checker = DuplicateChecker()
+            self.assertIsNone(checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+            self.assertEqual([d.subpath('1')], checker._walks.keys())
+
+    def test_file_added_after_check_is_not_removed(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            checker = DuplicateChecker()
+            self.assertIsNone(checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+            d.make_file('2/new_precious', 'data')
+
+            self.assertRaises(NotDuplicate,
+                lambda: checker.process_duplicate(d.subpath('1'), d.subpath('2')))
+            self.assertTrue(file_exists(d.subpath('2/new_precious')))
+
+    def test_digest_of_changed_file_is_recomputed(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asd')
+            checker = DuplicateChecker()
+            self.assertIsNone(checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+            os.remove(d.subpath('2'))
+            d.make_file('2', 'asf')
+            checker.forget()
+
+            self.assertIn('differ', checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+    def test_digests_are_kept_when_comparing_same_files(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asd')
+            checker = DuplicateChecker()
+            self.assertIsNone(checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+            self.assertEqual(file_digest(d.subpath('1')), checker.known_digest(d.subpath('1')))
+            self.assertEqual(file_digest(d.subpath('2')), checker.known_digest(d.subpath('2')))
+
+    def test_changed_original_is_stat_ed_again(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asd')
+            d.make_file('3', 'asdf')
+            checker = DuplicateChecker()
+            self.assertIsNone(checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+            d.make_file('1', 'asdf')
+
+            self.assertIsNone(checker.not_duplicate_reason(d.subpath('1'), d.subpath('3')))
+
+    def test_fifos_are_not_read(self):
+        with TempDir() as d:
+            os.mkfifo(d.subpath('1'))
+            os.mkfifo(d.subpath('2'))
+
+            reason = DuplicateChecker().not_duplicate_reason(d.subpath('1'), d.subpath('2'))
+            self.assertIn('differ', reason)
+
+    def test_cached_digest_of_file_rewritten_with_restored_mtime_is_not_used(self):
+        with TempDir() as d:
+            d.make_file('1', 'aaa')
+            d.make_file('2', 'aaa')
+            checker = DuplicateChecker()
+            digest = checker.digest(d.subpath('2'))
+
+            st = os.stat(d.subpath('2'))
+            d.make_file('2', 'xyz')
+            os.utime(d.subpath('2'), (st.st_atime, st.st_mtime))
+            checker.forget()
+
+            self.assertIsNone(checker.known_digest(d.subpath('2')))
+            self.assertNotEqual(digest, checker.digest(d.subpath('2')))
+            self.assertIn('differ', checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+    def test_equal_digests_are_confirmed_by_content(self):
+        with TempDir() as d:
+            d.make_file('1', 'aaa')
+            d.make_file('2', 'xyz')
+            checker = DuplicateChecker()
+            checker.known_digest = lambda fname: 'same digest'
+
+            self.assertIn('differ', checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+    def test_known_different_digests_reject_without_reading(self):
+        with TempDir() as d:
+            d.make_file('1', 'aaa')
+            d.make_file('2', 'aaa')
+            checker = DuplicateChecker()
+            checker.known_digest = lambda fname: fname
+
+            self.assertIn('differ', checker.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+    def test_processed_duplicate_is_forgotten(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            orig = d.subpath('1')
+            duplicate = d.subpath('2')
+            checker = DuplicateChecker()
+
+            checker.process_duplicate(orig, duplicate)
+
+            self.assertTrue(file_exists(orig))
+            self.assertFalse(file_exists(duplicate))
+            self.assertRaises(NotDuplicate,
+                lambda: checker.process_duplicate(orig, duplicate))
+
+    def test_removal_is_done_with_the_process_parameter(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asd')
+
+            orig = d.subpath('1')
+            duplicate = d.subpath('2')
+            process_called = set()
+            def check_process_called(arg):
+                process_called.add(arg)
+
+            DuplicateChecker().process_duplicate(orig, duplicate, process=check_process_called)
+
+            self.assertEqual(process_called, set([duplicate]))
+            self.assertTrue(file_exists(duplicate))
+
+
+class Test_import(unittest.TestCase):
+
+    def test_heavy_modules_are_not_imported(self):
+        heavy_modules = ['argparse', 'hashlib', 'shutil', 'socket', 'tempfile', 'unittest']
+        script = 'import sys, rmdup; print " ".join(m for m in {0!r} if m in sys.modules)'.format(heavy_modules)
+
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=PACKAGE_PARENT_DIRECTORY)
+
+        self.assertEqual('', output.strip())
@@ -0,0 +1,62 @@
+# -*- encoding: utf-8 -*-
+import sys
+import unittest
+from StringIO import StringIO
+
+from rmdup import file_exists
+from rmdup.cli import main
+from util import TempDir
+
+
+def run_main(argv):
+    stdout = sys.stdout
+    sys.stdout = output = StringIO()
+    try:
+        main(argv)
+    finally:
+        sys.stdout = stdout
+    return output.getvalue()
+
+
+class Test_main(unittest.TestCase):
+
+    def test_duplicate_dir_is_removed(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+
+            output = run_main([d.subpath('1'), d.subpath('2')])
+
+            self.assertIn('sizes match, comparing content', output)
+            self.assertIn('removing', output)
+            self.assertFalse(file_exists(d.subpath('2')))
+
+    def test_dry_run_does_not_remove(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+
+            output = run_main(['-n', d.subpath('1'), d.subpath('2')])
+
+            self.assertIn('would be removed', output)
+            self.assertTrue(file_exists(d.subpath('2')))
+
+    def test_ignored_differences(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            d.make_file('2/extra', 'whatever')
+
+            run_main([d.subpath('1'), d.subpath('2'), 'extra'])
+
+            self.assertFalse(file_exists(d.subpath('2')))
+
+    def test_non_duplicate_is_reported_and_kept(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asf')
+
+            output = run_main([d.subpath('1'), d.subpath('2')])
+
+            self.assertIn('are not duplicates', output)
+            self.assertTrue(file_exists(d.subpath('2')))
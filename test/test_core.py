@@ -0,0 +1,103 @@
+# -*- encoding: utf-8 -*-
+import unittest
+
+from rmdup.core import file_exists, files_in, same_content, same_file_or_dir
+from util import EXISTING_FILE, NON_EXISTING_FILE, TempDir
+
+
+class Test_file_exists(unittest.TestCase):
+
+    def test_existing_file(self):
+        self.assertTrue(file_exists(EXISTING_FILE))
+
+    def test_non_existing_file(self):
+        self.assertFalse(file_exists(NON_EXISTING_FILE))
+
+
+class Test_same_file_or_dir(unittest.TestCase):
+
+    def test_same_file_or_dir(self):
+        fname = EXISTING_FILE
+        self.assertTrue(same_file_or_dir(fname, fname))
+
+    def test_different_files_same_content_is_not_same(self):
+        with TempDir() as d:
+            content = 'some text'
+            d.make_file('f1', content)
+            d.make_file('f2', content)
+            f1 = d.subpath('f1')
+            f2 = d.subpath('f2')
+
+            self.assertTrue(file_exists(f1))
+            self.assertTrue(file_exists(f2))
+
+            self.assertFalse(same_file_or_dir(f1, f2))
+
+    def  test_non_existing_files_are_not_same(self):
+        # that is - no exceptions are raised!
+        with TempDir() as d:
+            f = d.subpath('non_existing_file')
+            self.assertFalse(same_file_or_dir(f, f))
+
+
+class Test_same_content(unittest.TestCase):
+
+    def test_same_content(self):
+        with TempDir() as d:
+            content = 'same'
+            d.make_file('f1', content)
+            d.make_file('f2', content)
+
+            self.assertTrue(same_content(d.subpath('f1'), d.subpath('f2')))
+
+    def test_different_content(self):
+        with TempDir() as d:
+            d.make_file('f1', 'content\n')
+            d.make_file('f2', 'content\r\n')
+
+            self.assertFalse(same_content(d.subpath('f1'), d.subpath('f2')))
+
+    def test_same_file_multiple_reads(self):
+        with TempDir() as d:
+            d.make_file('f1', '12')
+            d.make_file('f2', '13')
+
+            reads = []
+
+            def counting_read_block(f):
+                buff = f.read(1)
+                reads.append(buff)
+                return buff
+
+            self.assertFalse(same_content(d.subpath('f1'), d.subpath('f2'), read_block=counting_read_block))
+            self.assertEqual(['1', '1', '2', '3'], reads)
+
+    def test_missing_files_are_not_same(self):
+        self.assertFalse(same_content(    EXISTING_FILE, NON_EXISTING_FILE))
+        self.assertFalse(same_content(NON_EXISTING_FILE,     EXISTING_FILE))
+        self.assertFalse(same_content(NON_EXISTING_FILE, NON_EXISTING_FILE))
+
+
+class Test_files_in(unittest.TestCase):
+
+    def test_subdirectories_traversed_all_files_returned(self):
+        with TempDir() as d:
+            files = set(['a', 'b/c', 'b/d/e', 'f/g'])
+            for f in files:
+                d.make_file(f, '')
+
+            self.assertEqual(files, set(files_in(d.path)))
+
+    def test_file_in_skip_path_not_in_result(self):
+        with TempDir() as d:
+            d.make_file('f', '')
+            d.make_file('f_skipped', '')
+
+            self.assertEqual(set(['f']), set(files_in(d.path, skip_paths=['f_skipped'])))
+
+    def test_file_in_directory_on_skip_path_not_in_result(self):
+        with TempDir() as d:
+            d.make_file('f', '')
+            d.make_file('skipped/dir/g', '')
+
+            self.assertEqual(set(['f']), set(files_in(d.path, skip_paths=['skipped/dir'])))
@@ -0,0 +1,521 @@
+# -*- encoding: utf-8 -*-
+import cPickle as pickle
+import errno
+import os
+import shutil
+import socket
+import sys
+import threading
+import unittest
+from StringIO import StringIO
+
+from rmdup.checker import file_digest
+from rmdup.daemon import (
+    DUPLICATE_RESPONSE,
+    IN_Q_OVERFLOW,
+    DuplicateIndex,
+    DuplicateServer,
+    IndexWatcher,
+    _recv_all,
+    main,
+    query)
+from util import TempDir
+
+
+class OutOfWatchesInotify:
+    '''Fails to watch directories named "unwatched"'''
+
+    fd = -1
+
+    def add_watch(self, path):
+        if os.path.basename(path) == 'unwatched':
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+        return hash(path)
+
+    def rm_watch(self, wd):
+        pass
+
+    def read_events(self):
+        return []
+
+    def close(self):
+        pass
+
+
+def rewrite_keeping_times(d, fname, content):
+    st = os.stat(d.subpath(fname))
+    d.make_file(fname, content)
+    os.utime(d.subpath(fname), (st.st_atime, st.st_mtime))
+
+
+class Test_DuplicateIndex(unittest.TestCase):
+
+    def test_scan_finds_all_files(self):
+        with TempDir() as d:
+            files = set(['a', 'b/c', 'b/d/e'])
+            for f in files:
+                d.make_file(f, '')
+
+            index = DuplicateIndex(d.path)
+            index.scan()
+
+            self.assertEqual(files, set(index.files('')))
+            self.assertEqual(set(['c', 'd/e']), set(index.files('b')))
+
+    def test_relpath_outside_root_is_none(self):
+        with TempDir() as d:
+            index = DuplicateIndex(d.subpath('root'))
+            self.assertEqual('x/y', index.relpath(d.subpath('root/x/y')))
+            self.assertIsNone(index.relpath(d.subpath('root2/x')))
+
+    def test_rescan_keeps_digest_of_unchanged_file(self):
+        with TempDir() as d:
+            d.make_file('f', 'content')
+            index = DuplicateIndex(d.path)
+            index.scan()
+            index.entry('f')[1] = 'cached digest'
+
+            index.scan()
+
+            self.assertEqual('cached digest', index.digest(d.subpath('f')))
+
+    def test_update_of_changed_file_drops_digest(self):
+        with TempDir() as d:
+            d.make_file('f', 'content')
+            index = DuplicateIndex(d.path)
+            index.scan()
+            index.entry('f')[1] = 'cached digest'
+
+            d.make_file('f', 'changed content')
+            index.update('f')
+
+            self.assertEqual(file_digest(d.subpath('f')), index.digest(d.subpath('f')))
+
+    def test_rescan_drops_digest_of_file_rewritten_with_restored_mtime(self):
+        with TempDir() as d:
+            d.make_file('f', 'aaa')
+            index = DuplicateIndex(d.path)
+            index.scan()
+            index.entry('f')[1] = 'cached digest'
+
+            rewrite_keeping_times(d, 'f', 'xyz')
+            index.scan()
+
+            self.assertEqual(file_digest(d.subpath('f')), index.digest(d.subpath('f')))
+
+    def test_digests_are_computed_in_the_background(self):
+        with TempDir() as d:
+            d.make_file('f', 'content')
+            d.make_file('d/g', 'other content')
+            index = DuplicateIndex(d.path)
+            index.scan()
+
+            while index.hashing_pending():
+                index.hash_step()
+
+            self.assertEqual(file_digest(d.subpath('f')), index.entry('f')[1])
+            self.assertEqual(file_digest(d.subpath('d/g')), index.entry('d/g')[1])
+
+    def test_fifo_is_not_hashed(self):
+        with TempDir() as d:
+            d.make_file('f', 'content')
+            os.mkfifo(d.subpath('fifo'))
+            index = DuplicateIndex(d.path)
+            index.scan()
+
+            while index.hashing_pending():
+                index.hash_step()
+
+            self.assertIsNone(index.entry('fifo')[1])
+            self.assertIsNone(index.digest(d.subpath('fifo')))
+            self.assertEqual(file_digest(d.subpath('f')), index.entry('f')[1])
+
+    def test_file_changed_while_hashing_gets_digest_of_new_content(self):
+        with TempDir() as d:
+            d.make_file('f', 'content')
+            index = DuplicateIndex(d.path)
+            index.scan()
+            index.hash_step()
+
+            d.make_file('f', 'changed content')
+            index.discard('f')
+            index.update('f')
+            while index.hashing_pending():
+                index.hash_step()
+
+            self.assertEqual(file_digest(d.subpath('f')), index.entry('f')[1])
+
+    def test_update_of_removed_file_forgets_it(self):
+        with TempDir() as d:
+            d.make_file('f', '')
+            index = DuplicateIndex(d.path)
+            index.scan()
+
+            os.remove(d.subpath('f'))
+            index.update('f')
+
+            self.assertIsNone(index.entry('f'))
+
+    def test_duplicate_files(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asd')
+            d.make_file('3', 'asf')
+            index = DuplicateIndex(d.path)
+            index.scan()
+
+            self.assertIsNone(index.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+            self.assertIn('differ', index.not_duplicate_reason(d.subpath('1'), d.subpath('3')))
+
+    def test_digests_are_trusted(self):
+        with TempDir() as d:
+            d.make_file('1', 'aaa')
+            d.make_file('2', 'xyz')
+            index = DuplicateIndex(d.path)
+            index.scan()
+            index.entry('1')[1] = index.entry('2')[1] = 'same digest'
+
+            self.assertIsNone(index.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+    def test_missing_digests_are_computed_on_query(self):
+        with TempDir() as d:
+            d.make_file('1', 'aaa')
+            d.make_file('2', 'aaa')
+            index = DuplicateIndex(d.path)
+            index.scan()
+
+            self.assertIsNone(index.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+            self.assertEqual(file_digest(d.subpath('2')), index.entry('2')[1])
+
+    def test_duplicate_dirs_with_ignored_differences(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            d.make_file('2/extra/file', 'whatever')
+            index = DuplicateIndex(d.path)
+            index.scan()
+
+            reason = index.not_duplicate_reason(d.subpath('1'), d.subpath('2'))
+            self.assertIn('extra non-duplicate file[s]', reason)
+            self.assertIsNone(index.not_duplicate_reason(d.subpath('1'), d.subpath('2'), ['extra']))
+
+    def test_dirs_with_different_content_not_duplicate(self):
+        with TempDir() as d:
+            d.make_file('1/d/f', 'asd')
+            d.make_file('2/d/f', 'asf')
+            index = DuplicateIndex(d.path)
+            index.scan()
+
+            self.assertIn('differ', index.not_duplicate_reason(d.subpath('1'), d.subpath('2')))
+
+    def test_original_outside_root_is_checked_on_the_file_system(self):
+        with TempDir() as d:
+            d.make_file('outside/f', 'asd')
+            d.make_file('root/dup/f', 'asd')
+            index = DuplicateIndex(d.subpath('root'))
+            index.scan()
+
+            self.assertIsNone(index.not_duplicate_reason(d.subpath('outside'), d.subpath('root/dup')))
+            d.make_file('root/dup/extra', '')
+            index.update('dup/extra')
+            reason = index.not_duplicate_reason(d.subpath('outside'), d.subpath('root/dup'))
+            self.assertIn('extra non-duplicate file[s]', reason)
+
+    def test_changes_of_original_outside_root_are_noticed(self):
+        with TempDir() as d:
+            d.make_file('outside/f', 'as')
+            d.make_file('root/dup/f', 'asd')
+            d.make_file('root/dup/g', '')
+            index = DuplicateIndex(d.subpath('root'))
+            index.scan()
+            reason = index.not_duplicate_reason(d.subpath('outside'), d.subpath('root/dup'))
+            self.assertIn('extra non-duplicate file[s]', reason)
+
+            d.make_file('outside/g', '')
+            reason = index.not_duplicate_reason(d.subpath('outside'), d.subpath('root/dup'))
+            self.assertIn('sizes of files', reason)
+
+            d.make_file('outside/f', 'asd')
+            self.assertIsNone(index.not_duplicate_reason(d.subpath('outside'), d.subpath('root/dup')))
+
+    def test_missing_duplicate_not_duplicate(self):
+        with TempDir() as d:
+            d.make_file('1', '')
+            index = DuplicateIndex(d.path)
+            index.scan()
+
+            reason = index.not_duplicate_reason(d.subpath('1'), d.subpath('2'))
+            self.assertIn('does not exist', reason)
+
+    def test_saved_index_is_loaded(self):
+        with TempDir() as d:
+            d.make_file('root/f', 'content')
+            index = DuplicateIndex(d.subpath('root'))
+            index.scan()
+            index.entry('f')[1] = 'cached digest'
+            index.save(d.subpath('index'))
+
+            loaded = DuplicateIndex.load(d.subpath('index'), d.subpath('root'))
+            loaded.scan()
+
+            self.assertEqual('cached digest', loaded.digest(d.subpath('root/f')))
+
+    def test_index_saved_for_other_root_is_not_loaded(self):
+        with TempDir() as d:
+            d.make_file('root/f', 'content')
+            index = DuplicateIndex(d.subpath('root'))
+            index.scan()
+            index.save(d.subpath('index'))
+
+            loaded = DuplicateIndex.load(d.subpath('index'), d.path)
+
+            self.assertEqual({}, loaded.tree)
+
+    def check_unusable_index_is_ignored(self, content):
+        with TempDir() as d:
+            d.make_file('index', content)
+
+            loaded = DuplicateIndex.load(d.subpath('index'), d.path)
+
+            self.assertEqual({}, loaded.tree)
+
+    def test_missing_index_is_ignored(self):
+        with TempDir() as d:
+            loaded = DuplicateIndex.load(d.subpath('index'), d.path)
+
+            self.assertEqual({}, loaded.tree)
+
+    def test_garbage_index_is_ignored(self):
+        self.check_unusable_index_is_ignored('garbage')
+
+    def test_truncated_index_is_ignored(self):
+        self.check_unusable_index_is_ignored(pickle.dumps({'format': 2, 'root': '/'}, 2)[:-5])
+
+    def test_foreign_index_is_ignored(self):
+        self.check_unusable_index_is_ignored(pickle.dumps([1], 2))
+
+    def test_index_referencing_unknown_class_is_ignored(self):
+        self.check_unusable_index_is_ignored('cno_such_module\nNoSuchClass\np0\n.')
+
+
+class Test_IndexWatcher(unittest.TestCase):
+
+    def check_change_is_followed(self, change, check):
+        with TempDir() as d:
+            d.make_file('d/f', 'content')
+            watcher = IndexWatcher(DuplicateIndex(d.path))
+            try:
+                watcher.rescan()
+
+                change(d)
+                watcher.process_events()
+
+                check(watcher.index)
+            finally:
+                watcher.inotify.close()
+
+    def test_new_file_is_indexed(self):
+        self.check_change_is_followed(
+            lambda d: d.make_file('d/g', 'x'),
+            lambda index: self.assertIsNotNone(index.entry('d/g')))
+
+    def test_modified_file_is_updated(self):
+        self.check_change_is_followed(
+            lambda d: d.make_file('d/f', 'modified content'),
+            lambda index: self.assertEqual(len('modified content'), index.entry('d/f')[0][0]))
+
+    def test_file_rewritten_with_restored_mtime_is_not_duplicate(self):
+        with TempDir() as d:
+            d.make_file('a', 'aaa')
+            d.make_file('b', 'aaa')
+            watcher = IndexWatcher(DuplicateIndex(d.path))
+            try:
+                watcher.rescan()
+                index = watcher.index
+                self.assertIsNone(index.not_duplicate_reason(d.subpath('a'), d.subpath('b')))
+
+                rewrite_keeping_times(d, 'b', 'xyz')
+                watcher.process_events()
+
+                self.assertIsNotNone(index.not_duplicate_reason(d.subpath('a'), d.subpath('b')))
+                self.assertEqual(file_digest(d.subpath('b')), index.digest(d.subpath('b')))
+            finally:
+                watcher.inotify.close()
+
+    def test_removed_directory_is_forgotten(self):
+        self.check_change_is_followed(
+            lambda d: shutil.rmtree(d.subpath('d')),
+            lambda index: self.assertEqual(set(), set(index.files(''))))
+
+    def test_files_in_new_directory_are_indexed(self):
+        self.check_change_is_followed(
+            lambda d: d.make_file('x/y/z', ''),
+            lambda index: self.assertIsNotNone(index.entry('x/y/z')))
+
+    def test_moved_directory_is_followed(self):
+        self.check_change_is_followed(
+            lambda d: os.rename(d.subpath('d'), d.subpath('e')),
+            lambda index: self.assertEqual(set(['e/f']), set(index.files(''))))
+
+    def test_files_below_symlinked_directory_are_watched(self):
+        with TempDir() as d:
+            d.make_file('outside/f', 'content')
+            d.make_file('root/g', '')
+            os.symlink(d.subpath('outside'), d.subpath('root/link'))
+            watcher = IndexWatcher(DuplicateIndex(d.subpath('root')))
+            try:
+                watcher.rescan()
+
+                d.make_file('outside/f', 'modified content')
+                watcher.process_events()
+
+                self.assertEqual(len('modified content'), watcher.index.entry('link/f')[0][0])
+            finally:
+                watcher.inotify.close()
+
+    def test_new_symlink_to_directory_is_indexed(self):
+        with TempDir() as d:
+            d.make_file('outside/f', 'content')
+            d.make_file('root/g', '')
+            watcher = IndexWatcher(DuplicateIndex(d.subpath('root')))
+            try:
+                watcher.rescan()
+
+                os.symlink(d.subpath('outside'), d.subpath('root/link'))
+                watcher.process_events()
+                d.make_file('outside/h', '')
+                watcher.process_events()
+
+                self.assertEqual(set(['g', 'link/f', 'link/h']), set(watcher.index.files('')))
+            finally:
+                watcher.inotify.close()
+
+    def test_changes_below_unwatched_directory_are_not_missed(self):
+        with TempDir() as d:
+            d.make_file('orig/unwatched/f', 'asd')
+            d.make_file('dup/unwatched/f', 'asd')
+            stderr = sys.stderr
+            sys.stderr = StringIO()
+            try:
+                watcher = IndexWatcher(DuplicateIndex(d.path), inotify=OutOfWatchesInotify())
+                watcher.rescan()
+            finally:
+                sys.stderr = stderr
+            index = watcher.index
+            self.assertIsNone(index.not_duplicate_reason(d.subpath('orig'), d.subpath('dup')))
+
+            # no event arrives about it
+            d.make_file('dup/unwatched/precious', 'data')
+
+            reason = index.not_duplicate_reason(d.subpath('orig'), d.subpath('dup'))
+            self.assertIn('extra non-duplicate file[s]', reason)
+
+    def test_queue_overflow_rescans(self):
+        with TempDir() as d:
+            watcher = IndexWatcher(DuplicateIndex(d.path))
+            try:
+                watcher.rescan()
+                d.make_file('f', '')
+
+                watcher.process_event(-1, IN_Q_OVERFLOW, '')
+
+                self.assertIsNotNone(watcher.index.entry('f'))
+            finally:
+                watcher.inotify.close()
+
+
+class Test_DuplicateServer(unittest.TestCase):
+
+    def check_request(self, d, request):
+        watcher = IndexWatcher(DuplicateIndex(d.path))
+        server = DuplicateServer(watcher, None)
+        client, conn = socket.socketpair()
+        try:
+            watcher.rescan()
+            client.sendall(request)
+            client.shutdown(socket.SHUT_WR)
+            server.handle(conn)
+            conn.close()
+            return _recv_all(client)
+        finally:
+            client.close()
+            watcher.inotify.close()
+
+    def test_duplicate_gets_empty_response(self):
+        with TempDir() as d:
+            d.make_file('1/f', 'asd')
+            d.make_file('2/f', 'asd')
+            d.make_file('2/extra', 'whatever')
+
+            request = '\0'.join([d.subpath('1'), d.subpath('2'), 'extra'])
+            self.assertEqual(DUPLICATE_RESPONSE, self.check_request(d, request))
+
+    def test_non_duplicate_gets_reason(self):
+        with TempDir() as d:
+            d.make_file('1', 'asd')
+            d.make_file('2', 'asdf')
+
+            request = '\0'.join([d.subpath('1'), d.subpath('2')])
+            self.assertIn('differ', self.check_request(d, request))
+
+    def test_missing_original_gets_reason(self):
+        with TempDir() as d:
+            d.make_file('dup/f', 'asd')
+
+            # outside of the index, so it is read from the file system
+            missing_orig = d.path + '_missing_orig'
+            request = '\0'.join([missing_orig, d.subpath('dup')])
+            self.assertIn('checking failed', self.check_request(d, request))
+
+    def test_no_answer_is_not_duplicate(self):
+        with TempDir() as d:
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(d.subpath('socket'))
+            server.listen(1)
+
+            def close_without_answer():
+                conn, _ = server.accept()
+                _recv_all(conn)
+                conn.close()
+            thread = threading.Thread(target=close_without_answer)
+            thread.start()
+            try:
+                reason = query(d.subpath('socket'), d.subpath('1'), d.subpath('2'))
+            finally:
+                thread.join()
+                server.close()
+
+            self.assertEqual('no answer from the daemon', reason)
+
+    def test_malformed_request(self):
+        with TempDir() as d:
+            self.assertEqual('malformed request', self.check_request(d, 'x'))
+
+    def test_client_not_finishing_its_request_is_dropped(self):
+        with TempDir() as d:
+            watcher = IndexWatcher(DuplicateIndex(d.path))
+            server = DuplicateServer(watcher, None, timeout=0.01)
+            client, conn = socket.socketpair()
+            try:
+                client.sendall(d.subpath('1'))
+
+                server.handle(conn)
+            finally:
+                conn.close()
+                client.close()
+                watcher.inotify.close()
+
+
+class Test_main(unittest.TestCase):
+
+    def test_check_without_daemon_prints_error(self):
+        with TempDir() as d:
+            stdout = sys.stdout
+            sys.stdout = output = StringIO()
+            try:
+                main(['-s', d.subpath('no_socket'), 'check', d.subpath('1'), d.subpath('2')])
+            finally:
+                sys.stdout = stdout
+
+            self.assertIn('can not reach the daemon', output.getvalue())
+            self.assertEqual(1, len(output.getvalue().splitlines()))
@@ -0,0 +1,62 @@
+# -*- encoding: utf-8 -*-
+import unittest
+
+from rmdup import file_exists
+from util import TempDir
+
+
+class Test_TempDir(unittest.TestCase):
+
+    def test_new_directory_created_and_removed(self):
+        tempdir = None
+        with TempDir() as d:
+            tempdir = d.path
+
+            self.assertTrue(file_exists(tempdir))
+
+        self.assertFalse(file_exists(tempdir))
+
+    def test_temp_file_created_and_removed(self):
+        tempfile = None
+        with TempDir() as d:
+            tempfile = d.subpath('tempfile')
+            with open(tempfile, 'w'):
+                pass
+
+            self.assertTrue(file_exists(tempfile))
+
+        self.assertFalse(file_exists(tempfile))
+
+    def check_make_file(self, relpath):
+        with TempDir() as d:
+            fname = d.subpath(relpath)
+            self.assertFalse(file_exists(fname))
+            content = 'some text content'
+
+            d.make_file(relpath, content)
+
+            self.assertTrue(file_exists(fname))
+            with open(fname) as f:
+                self.assertEqual(content, f.read())
+
+    def test_make_file_creates_a_file(self):
+        self.check_make_file('test_file')
+
+    def test_make_file_creates_a_file_in_a_non_existent_subdir(self):
+        self.check_make_file('x/test_file')
+
+    def test_make_file_creates_a_file_with_two_subdirs(self):
+        self.check_make_file('x/y/test_file')
+
+    def test_make_file_creates_a_file_in_binary_mode(self):
+        relpath = 'file'
+        with TempDir() as d:
+            fname = d.subpath(relpath)
+            self.assertFalse(file_exists(fname))
+            content = 'some\ntext\rcontent\r\n'
+
+            d.make_file(relpath, content)
+
+            self.assertTrue(file_exists(fname))
+            with open(fname, 'rb') as f:
+                self.assertEqual(content, f.read())
@@ -0,0 +1,37 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+
+TEST_DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+EXISTING_FILE = os.path.join(TEST_DIRECTORY, 'existing_file')
+NON_EXISTING_FILE = os.path.join(TEST_DIRECTORY, 'non_existing_file')
+
+
+class TempDir:
+    '''Temporary directory usable only by the current user.
+
+    Removed with its content after exiting.'''
+
+    def __init__(self):
+        self.path = None
+
+    def __enter__(self):
+        self.path = tempfile.mkdtemp()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.path = None
+
+    def subpath(self, relative_path):
+        return os.path.join(self.path, relative_path)
+
+    def make_file(self, fname, content):
+        filename = self.subpath(fname)
+        dirname = os.path.dirname(filename)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        with open(filename, 'wb') as f:
+            f.write(content)